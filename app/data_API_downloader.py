@@ -2,6 +2,7 @@
 import pandas as pd
 import requests
 import numpy as np
+import os
 from zipfile import ZipFile
 import geopandas as gp
 from shapely.geometry import Point
@@ -38,6 +39,206 @@ class MethodOrderError(Exception):
         return f"MethodOrderError: '{self.method_name}' was called out of order.\nExpected order: {self.expected_order}"
 
 
+class RecordIndex:
+    """
+    RecordIndex keeps track of the criminal records ingested from the kriminalita.policie API. The same record (same "id") can show up in
+    several monthly exports, for instance after its state was updated, and it would then be counted more than once. The index stores the 64-bit hash of every
+    record id together with its latest version (the YYYYMM of the export it came from) as two sorted numpy arrays, so each month is looked up and added
+    with np.searchsorted instead of running drop_duplicates over the whole history. It also remembers which months were already ingested.
+
+    If path is given the index is loaded from and saved to that .npz file, which lets Downloader.get_multiple_years() ingest only the months that are new
+    since the previous runs. Rows without an id cannot be matched between the exports, so they are always kept and never enter the index.
+
+    ...
+
+    Attributes
+    ----------
+    path : str, None
+        Path to the .npz file where the index is stored (default is None), ".npz" is appended if it is missing. If the file does not exist yet an empty index
+        is started and save() creates it. If None the index is only kept in memory.
+
+    Methods
+    -------
+    hash_ids(ids)
+        Returns the hashes of the record ids and a mask which rows have an id.
+
+    versions(hashes)
+        Returns the latest known version of every hash, 0 for the hashes that are not in the index.
+
+    is_ingested(version)
+        Returns whether the month with the given version was already ingested.
+
+    update(hashes, versions)
+        Adds the hashes to the index or raises their version if the new one is higher.
+
+    merge(other)
+        Adds all records and months of another RecordIndex to the index.
+
+    deduplicate(month_data, version)
+        Returns the records of one month that are not superseded by a newer version already in the index and adds them to the index.
+
+    is_latest(hashes, versions, has_id)
+        Returns boolean mask which records are the latest known version of their id.
+
+    save()
+        Saves the index to the .npz file given by path.
+    """
+
+    def __init__(self, path = None) -> None:
+        #np.savez appends .npz to the file name, so load from the same name it saves to
+        if path is not None and not str(path).endswith(".npz"):
+            path = str(path) + ".npz"
+        self.path = path
+        self._hashes = np.array([], dtype=np.uint64)
+        self._versions = np.array([], dtype=np.int32)
+        self._months = np.array([], dtype=np.int32)
+        #load the index from the previous runs, a new index is started if the file was not created yet
+        if self.path is not None and os.path.exists(self.path):
+            with np.load(self.path) as stored:
+                self._hashes = stored["hashes"]
+                self._versions = stored["versions"]
+                self._months = stored["months"]
+
+    def __len__(self):
+        return len(self._hashes)
+
+    @staticmethod
+    def hash_ids(ids):
+        """
+        Hashes the record ids to 64-bit unsigned integers. The ids are normalised to strings first, so an id read as float in one month
+        (for instance because of a missing value in the column) gets the same hash as the same id read as integer or string in another month.
+
+        Parameters:
+        ids : pandas.Series
+            The "id" column of the crime data.
+
+        Returns:
+        tuple of numpy.ndarray :
+            The hashes of the ids (0 for the rows with a missing id) and a boolean mask that is False for the rows with a missing id.
+        """
+        if pd.api.types.is_float_dtype(ids) and (ids.dropna() % 1 == 0).all():
+            ids = ids.astype("Int64")
+        ids = ids.astype("string")
+        has_id = ids.notna().to_numpy()
+        hashes = np.zeros(len(ids), dtype=np.uint64)
+        hashes[has_id] = pd.util.hash_array(ids[has_id].to_numpy(dtype=object))
+        return hashes, has_id
+
+    def versions(self, hashes):
+        """
+        Looks up the latest known version of the hashes.
+
+        Parameters:
+        hashes : numpy.ndarray
+            The hashes of the record ids.
+
+        Returns:
+        numpy.ndarray :
+            The versions (YYYYMM) of the hashes, 0 for the hashes that are not in the index.
+        """
+        positions = np.searchsorted(self._hashes, hashes)
+        found = positions < len(self._hashes)
+        found[found] = self._hashes[positions[found]] == hashes[found]
+        versions = np.zeros(len(hashes), dtype=np.int32)
+        versions[found] = self._versions[positions[found]]
+        return versions
+
+    def is_ingested(self, version):
+        """
+        Checks whether the month was already ingested into the index.
+
+        Parameters:
+        version : int
+            The version of the month in the form YYYYMM.
+
+        Returns:
+        bool :
+            True if the month was already ingested.
+        """
+        return bool(np.isin(version, self._months))
+
+    def update(self, hashes, versions):
+        """
+        Adds the hashes to the index or raises their version if the new one is higher. The known hashes are updated in place
+        and the new ones are inserted at their sorted positions.
+
+        Parameters:
+        hashes : numpy.ndarray
+            Unique hashes of the record ids.
+        versions : numpy.ndarray
+            The versions (YYYYMM) of the hashes.
+        """
+        order = np.argsort(hashes)
+        hashes = hashes[order]
+        versions = np.asarray(versions, dtype=np.int32)[order]
+        positions = np.searchsorted(self._hashes, hashes)
+        found = positions < len(self._hashes)
+        found[found] = self._hashes[positions[found]] == hashes[found]
+        self._versions[positions[found]] = np.maximum(self._versions[positions[found]], versions[found])
+        self._hashes = np.insert(self._hashes, positions[~found], hashes[~found])
+        self._versions = np.insert(self._versions, positions[~found], versions[~found])
+
+    def merge(self, other):
+        """
+        Adds all records and ingested months of another RecordIndex to the index.
+
+        Parameters:
+        other : RecordIndex
+            The index to merge into this one.
+        """
+        self.update(other._hashes, other._versions)
+        self._months = np.union1d(self._months, other._months).astype(np.int32)
+
+    def deduplicate(self, month_data, version):
+        """
+        Deduplicates the data of one month against the index and adds the kept ids with their version to it. The month is marked as ingested.
+
+        Parameters:
+        month_data : pandas.DataFrame
+            The data of one month as returned by Downloader.unzip_files_return_dataframe().
+        version : int
+            The version of the month in the form YYYYMM.
+
+        Returns:
+        tuple of pandas.DataFrame and numpy.ndarray :
+            The records that are not superseded by a newer version, the hashes of their ids and the mask which of them have an id.
+        """
+        hashes, has_id = self.hash_ids(month_data["id"])
+        #keep the last row if the same id is in one export more than once, rows without id are always kept
+        keep = ~(pd.Index(hashes).duplicated(keep="last") & has_id)
+        #drop the rows for which a newer version is already in the index
+        keep &= ~((self.versions(hashes) > version) & has_id)
+        hashes, has_id = hashes[keep], has_id[keep]
+        self.update(hashes[has_id], np.full(has_id.sum(), version, dtype=np.int32))
+        self._months = np.union1d(self._months, [version]).astype(np.int32)
+        return month_data[keep], hashes, has_id
+
+    def is_latest(self, hashes, versions, has_id):
+        """
+        Checks which records are the latest known version of their id.
+
+        Parameters:
+        hashes : numpy.ndarray
+            The hashes of the record ids.
+        versions : numpy.ndarray
+            The versions (YYYYMM) of the records.
+        has_id : numpy.ndarray
+            Boolean mask which records have an id, the records without id are always kept.
+
+        Returns:
+        numpy.ndarray :
+            Boolean mask that is True for the records that are the latest version.
+        """
+        return (self.versions(hashes) == versions) | ~has_id
+
+    def save(self):
+        """
+        Saves the index to the .npz file given by path. Does nothing if path is None.
+        """
+        if self.path is not None:
+            np.savez(self.path, hashes=self._hashes, versions=self._versions, months=self._months)
+
+
 class Downloader:
     """
     Downloader is a class for downloading data from kriminalita.policie API that are stored as geographical points with their attributes specifying them. It can work in two regimes. 
@@ -66,9 +267,11 @@ class Downloader:
         Returns DataFrame if the previous get_request() was successful by unzipping the downloaded file. Make sure not to rename the downloaded files. Returns None if it was not able
         to unzip the downloaded zip file.  
 
-    get_multiple_years(years)
+    get_multiple_years(years, record_index)
         Returns a DataFrame with all the data available for the specified years. It is enough that some months of the year do have available data. 
-        For instance when some months from year 2023 are not yet available just the months where it manages to get the data will be part of the DataFrame
+        For instance when some months from year 2023 are not yet available just the months where it manages to get the data will be part of the DataFrame.
+        Records that show up in several monthly exports are kept only once in their latest version (see RecordIndex). With record_index the ingestion
+        is incremental: only the months that are not in the stored index yet are downloaded and superseded_ids lists the records that replace an earlier version.
 
         ...
 
@@ -78,6 +281,14 @@ class Downloader:
             List of years in integer form specifing the years from which you want to collect the data. The year has to be higer or equal to 2012 and in order to obtain the DataFrame
             at least some of the years have to have available data for them. Raises TypeError if non-integer list ist passed. Raises ValueError if any of the years if smaller than 2012.
 
+        record_index : str, None
+            Path to the .npz file of a RecordIndex kept between runs (default is None). If None every call deduplicates only the months it downloads.
+            If set, the file is created or updated on every call and each call returns only the records that are new or updated since the earlier runs.
+
+    superseded_ids : pandas.Series
+        The ids of the records returned by the last get_multiple_years() call that replace a version returned by an earlier run with the same record_index.
+        Drop these ids from the data of the earlier runs before combining it with the new data.
+
     Raises
     ------
     TypeError 
@@ -143,41 +354,77 @@ class Downloader:
             print("Downloader was not able to unzip the file. It might have been renamed or deleted try to repeat your previous steps and follow the instructions carefully.")
             return None
         
-    def get_multiple_years(self,years):
+    def get_multiple_years(self,years,record_index = None):
         """
-        Downloads data for multiple years and combines them into a single DataFrame.
+        Downloads data for multiple years and combines them into a single DataFrame. Records that show up in more than one monthly export
+        are kept only once in their latest version.
+
+        Without record_index every call is independent and deduplicates only the months it downloads. With record_index the ingestion is incremental:
+        the months already in the stored index are skipped, the new months are deduplicated against it and the index is saved again. The result then
+        holds only the records that are new or updated since the earlier runs, records with a newer version from an earlier run are left out and the ids
+        of the records that replace a version from an earlier run are stored in superseded_ids. Combining the results of all runs after dropping
+        superseded_ids from the older ones gives every record once in its latest version, also when older months are backfilled later.
 
         Parameters:
         years : list of int
             A list of years for which to download the data.
+        record_index : str, None
+            Path to the .npz file of a RecordIndex used for incremental ingestion (default is None). If None nothing is read or written.
 
         Returns:
         pandas.DataFrame : 
-            The combined data for the specified years as a DataFrame.
+            The combined data for the specified years as a DataFrame. Empty if all the months were already ingested into record_index.
 
         Raises :
         ValueError
             If the data for the specified years is not available on the API.
         """
         data = []
+        hashes = []
+        versions = []
+        has_id = []
         #check that all years are integers greater than 2011
         for year in years:
             if not isinstance(year, int):
                 raise TypeError("Expected an integer, but received {}.".format(type(year).__name__))
             if year < 2012:
                 raise ValueError("The year has to be greater than 2012.")
-            
+        
+        index = RecordIndex(record_index)
+        #keep the state from the earlier runs to find the records that replace one of their versions
+        previous_index = RecordIndex()
+        previous_index.merge(index)
+        skipped_months = 0
         for year in years:
             for month in self._months_mapping:
                 self._file_name = f"{year}" + month
+                #months from the earlier runs are already part of their results
+                if index.is_ingested(int(self._file_name)):
+                    skipped_months += 1
+                    continue
                 file = self.get_request()
                 unzipped_file = self.unzip_files_return_dataframe()
                 if isinstance(unzipped_file,pd.DataFrame):
+                    #drop the records that already have a newer version in the index
+                    unzipped_file, month_hashes, month_has_id = index.deduplicate(unzipped_file, int(self._file_name))
                     data.append(unzipped_file)
+                    hashes.append(month_hashes)
+                    has_id.append(month_has_id)
+                    versions.append(np.full(len(month_hashes), int(self._file_name), dtype=np.int32))
+        if not data and skipped_months:
+            self.superseded_ids = pd.Series([], dtype=object)
+            return pd.DataFrame()
         try:
-            return pd.concat(data,axis=0,ignore_index=True)
+            data = pd.concat(data,axis=0,ignore_index=True)
         except:
             raise ValueError("You might have chosen years that do not have the data available yet. Try to check this on the kriminalita.policie API.")
+        index.save()
+        hashes, versions, has_id = np.concatenate(hashes), np.concatenate(versions), np.concatenate(has_id)
+        #keep only the latest version of the records that were updated in a later month
+        latest = index.is_latest(hashes, versions, has_id)
+        data, hashes, has_id = data[latest].reset_index(drop=True), hashes[latest], has_id[latest]
+        self.superseded_ids = data.loc[(previous_index.versions(hashes) > 0) & has_id, "id"].reset_index(drop=True)
+        return data
         
 class DataPipeline:
     """
@@ -1,5 +1,7 @@
 from .visualizer import VisualizerOfCriminalData
-from .data_API_downloader import Downloader, DataPipeline, MethodOrderError
+from .data_API_downloader import Downloader, DataPipeline, MethodOrderError, RecordIndex
+import pandas as pd
+import numpy as np
 import pytest
 import os
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
@@ -123,6 +125,95 @@ def test_wrong_order_exception():
         pipeline.merge_final_table()
     assert str(exc_info.value) == "MethodOrderError: 'merge_final_table' was called out of order.\nExpected order: ['match_crime_data_to_polygons', 'compute_counts_per_polygon', 'preprocess_paq_data', 'merge_final_table']"
 
+def test_record_index_deduplication():
+    index = RecordIndex()
+    first_month = pd.DataFrame({"id": ["a", "b", "c", None, None], "state": [1, 1, 1, 1, 2]})
+    second_month = pd.DataFrame({"id": ["b", "d", "d"], "state": [2, 1, 3]})
+    first_month, first_hashes, first_has_id = index.deduplicate(first_month, 202201)
+    second_month, second_hashes, second_has_id = index.deduplicate(second_month, 202202)
+    #the duplicated id within one month is kept only once, the rows without id are all kept
+    assert list(first_month["state"]) == [1, 1, 1, 1, 2]
+    assert list(second_month["state"]) == [2, 3]
+    hashes = np.concatenate([first_hashes, second_hashes])
+    has_id = np.concatenate([first_has_id, second_has_id])
+    versions = np.array([202201] * len(first_hashes) + [202202] * len(second_hashes))
+    data = pd.concat([first_month, second_month], ignore_index=True)[index.is_latest(hashes, versions, has_id)]
+    assert list(data["id"].fillna("-")) == ["a", "c", "-", "-", "b", "d"]
+    assert list(data["state"]) == [1, 1, 1, 2, 2, 3]
+    #backfilling an older month does not bring back the outdated version
+    backfill, _, _ = index.deduplicate(pd.DataFrame({"id": ["b", "e"], "state": [1, 1]}), 202112)
+    assert list(backfill["id"]) == ["e"]
+    assert len(index) == 5
+
+def test_record_index_hash_ids():
+    #the same id read as float, integer or string has the same hash
+    float_hashes, float_has_id = RecordIndex.hash_ids(pd.Series([1.0, np.nan]))
+    int_hashes, _ = RecordIndex.hash_ids(pd.Series([1, 2]))
+    str_hashes, _ = RecordIndex.hash_ids(pd.Series(["1", "2"]))
+    assert float_hashes[0] == int_hashes[0] == str_hashes[0]
+    assert list(float_has_id) == [True, False]
+    #an empty id is a real id and does not collide with the missing ones
+    hashes, has_id = RecordIndex.hash_ids(pd.Series(["", None]))
+    assert list(has_id) == [True, False]
+    assert hashes[0] != hashes[1]
+
+def test_record_index_save_and_reload(tmp_path):
+    #np.savez appends .npz, the index has to be loaded from the same file
+    path = str(tmp_path / "record_index")
+    index = RecordIndex(path)
+    index.deduplicate(pd.DataFrame({"id": ["x", "y"]}), 202205)
+    index.deduplicate(pd.DataFrame({"id": ["x"]}), 202302)
+    index.save()
+    assert os.path.exists(path + ".npz")
+    reloaded = RecordIndex(path)
+    assert len(reloaded) == 2
+    assert reloaded.is_ingested(202205) and reloaded.is_ingested(202302) and not reloaded.is_ingested(202206)
+    hashes, _ = RecordIndex.hash_ids(pd.Series(["x", "y", "z"]))
+    assert list(reloaded.versions(hashes)) == [202302, 202205, 0]
+
+def mock_downloader(monkeypatch, months):
+    downloader = Downloader(2022,5)
+    downloaded = []
+    monkeypatch.setattr(downloader, "get_request", lambda: downloaded.append(downloader._file_name))
+    monkeypatch.setattr(downloader, "unzip_files_return_dataframe", lambda: months.get(downloader._file_name))
+    return downloader, downloaded
+
+def test_multiple_years_deduplication(monkeypatch):
+    months = {"202205": pd.DataFrame({"id": [1, 2], "state": [1, 1]}),
+              "202302": pd.DataFrame({"id": [1.0, np.nan], "state": [3, 1]})}
+    downloader, _ = mock_downloader(monkeypatch, months)
+    data = downloader.get_multiple_years([2022,2023])
+    assert list(data["id"].fillna(0)) == [2, 1, 0]
+    assert list(data["state"]) == [1, 3, 1]
+    #without record_index every call is independent
+    data = downloader.get_multiple_years([2022])
+    assert list(data["id"]) == [1, 2]
+    assert len(downloader.superseded_ids) == 0
+
+def test_multiple_years_incremental(tmp_path, monkeypatch):
+    path = str(tmp_path / "record_index.npz")
+    months = {"202205": pd.DataFrame({"id": ["x", "y"], "state": [1, 1]}),
+              "202302": pd.DataFrame({"id": ["x", "z"], "state": [3, 1]})}
+    downloader, downloaded = mock_downloader(monkeypatch, months)
+    first = downloader.get_multiple_years([2023], record_index = path)
+    assert list(first["id"]) == ["x", "z"]
+    #backfilling 2022 leaves out x as its newer version was returned by the first run
+    backfill = downloader.get_multiple_years([2022], record_index = path)
+    assert list(backfill["id"]) == ["y"]
+    assert len(downloader.superseded_ids) == 0
+    #rerunning does not download the ingested months again and returns nothing new
+    downloaded.clear()
+    rerun = downloader.get_multiple_years([2022,2023], record_index = path)
+    assert rerun.empty
+    assert "202205" not in downloaded and "202302" not in downloaded
+    #a new month replaces the version of y from the backfill
+    months["202401"] = pd.DataFrame({"id": ["y"], "state": [4]})
+    new = downloader.get_multiple_years([2024], record_index = path)
+    assert list(downloader.superseded_ids) == ["y"]
+    combined = pd.concat([first, backfill], ignore_index=True)
+    combined = pd.concat([combined[~combined["id"].isin(downloader.superseded_ids)], new], ignore_index=True)
+    assert sorted(zip(combined["id"], combined["state"])) == [("x", 3), ("y", 4), ("z", 1)]
+
 
 def main():
     #running the test to test that if a column is missing the class will return ValueError for visualizer
@@ -144,6 +235,9 @@ def main():
     test_no_dataframe_pipeline()
     #tests when some method is called before it should have been correctly called
     test_wrong_order_exception()
+    #testing that records from several monthly exports are kept only once
+    test_record_index_deduplication()
+    test_record_index_hash_ids()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file